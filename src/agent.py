@@ -19,6 +19,8 @@ class Agent(object):
         self.last_state = "500_280_0"
         self.last_action = 0
         self.moves = []
+        self.td_delta_mean = 0  # Mean absolute Q-value change of the last game
+        self.td_delta_max = 0  # Max absolute Q-value change of the last game
         self.debug = debug
 
     def load_qvalues(self):
@@ -68,6 +70,7 @@ class Agent(object):
 
         # Q-learning score updates
         t = 1
+        deltas = []
         for experience in history:
             state = experience[0]
             act = experience[1]
@@ -83,12 +86,18 @@ class Agent(object):
                 cur_reward = self.reward[0]
 
             # Update
+            old_qvalue = self.qvalues[state][act]
             self.qvalues[state][act] = (1 - self.lr) * (
                 self.qvalues[state][act]
             ) + self.lr * (cur_reward + self.discount * max(self.qvalues[res_state]))
+            deltas.append(abs(self.qvalues[state][act] - old_qvalue))
 
             t += 1
 
+        # track size of Q-value changes for convergence detection
+        self.td_delta_mean = sum(deltas) / len(deltas)
+        self.td_delta_max = max(deltas)
+
         self.game_count += 1  # increase game count
         if dump_qvalues:
             self.dump_qvalues()  # Dump q values (if game count % DUMPING_N == 0)
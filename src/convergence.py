@@ -0,0 +1,76 @@
+"""ConvergenceMonitor class"""
+
+
+class ConvergenceMonitor(object):
+    """
+    Watches per-game scores and Q-value changes to decide when training has plateaued
+    The run is considered converged when, over the last `window` games:
+      - the mean score changed by less than `score_tolerance` (relative) compared
+        to the window before it, and
+      - the per-game Q-value change (mean or max absolute delta) averaged below
+        `delta_tolerance`
+    Both criteria have to hold for `patience` consecutive games before stopping
+    """
+
+    def __init__(
+        self,
+        window=100,
+        min_games=500,
+        score_tolerance=0.01,
+        delta_tolerance=1.0,
+        delta_stat="mean",
+        patience=1,
+    ):
+        if window < 1 or patience < 1:
+            raise ValueError("window and patience have to be positive")
+        self.window = window  # Number of games in a single comparison window
+        self.min_games = max(min_games, 2 * window)  # Never stop before this game
+        self.score_tolerance = score_tolerance
+        self.delta_tolerance = delta_tolerance
+        self.delta_stat = delta_stat  # "mean" or "max" absolute Q-value change
+        self.patience = patience
+        self.scores = []
+        self.deltas = []
+        self.streak = 0  # Consecutive games the criteria have held
+        self.stop_reason = None
+
+    def update(self, score, td_delta_mean, td_delta_max):
+        """
+        Record the result of a single game
+        Returns True if the run has converged and should be stopped
+        """
+        self.scores.append(score)
+        if self.delta_stat == "max":
+            self.deltas.append(td_delta_max)
+        else:
+            self.deltas.append(td_delta_mean)
+
+        if len(self.scores) < self.min_games:
+            return False
+
+        last_scores = self.scores[-self.window :]
+        prev_scores = self.scores[-2 * self.window : -self.window]
+        last_mean = sum(last_scores) / len(last_scores)
+        prev_mean = sum(prev_scores) / len(prev_scores)
+        score_change = (last_mean - prev_mean) / max(abs(prev_mean), 1)
+        last_deltas = self.deltas[-self.window :]
+        delta_mean = sum(last_deltas) / len(last_deltas)
+
+        if (
+            abs(score_change) < self.score_tolerance
+            and delta_mean < self.delta_tolerance
+        ):
+            self.streak += 1
+        else:
+            self.streak = 0
+
+        if self.streak >= self.patience:
+            self.stop_reason = (
+                f"Converged at game {len(self.scores)}: mean score over last "
+                f"{self.window} games {last_mean:.2f} (previous {prev_mean:.2f}, "
+                f"relative change |{score_change:.4f}| < {self.score_tolerance}), "
+                f"{self.delta_stat} Q-value change {delta_mean:.4f} "
+                f"< {self.delta_tolerance} for {self.streak} games"
+            )
+            return True
+        return False
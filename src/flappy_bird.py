@@ -5,6 +5,7 @@ import random
 import pygame
 import argparse
 from agent import Agent
+from convergence import ConvergenceMonitor
 
 
 # load images and their sizes
@@ -33,8 +34,16 @@ SCREEN_WIDTH = BACKGROUND_WIDTH
 SCREEN_HEIGHT = BACKGROUND_HEIGHT + BASE_IMAGE_HEIGHT
 
 
+def positive_int(value):
+    """argparse type for integers greater than zero"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive integer")
+    return number
+
+
 def main():
-    global FRAMERATE, CLOCK, SCREEN, ITER, DEBUG, agent
+    global FRAMERATE, CLOCK, SCREEN, ITER, DEBUG, agent, monitor
     pygame.init()
 
     # parse command line arguments
@@ -52,6 +61,48 @@ def main():
         default=120,
         help="Frames per second; 30 = normal, 60 = fast, 120 = very fast",
     )
+    parser.add_argument(
+        "--early-stop",
+        action="store_true",
+        help="stop before --iter games once scores and Q-values have converged",
+    )
+    parser.add_argument(
+        "--conv-window",
+        type=positive_int,
+        default=100,
+        help="number of games in a single convergence window",
+    )
+    parser.add_argument(
+        "--conv-min-games",
+        type=int,
+        default=500,
+        help="minimal number of games to play before early stopping",
+    )
+    parser.add_argument(
+        "--conv-score-tol",
+        type=float,
+        default=0.01,
+        help="max relative improvement of the mean score between windows",
+    )
+    parser.add_argument(
+        "--conv-delta-tol",
+        type=float,
+        default=1.0,
+        help="max average per-game Q-value change over the last window",
+    )
+    parser.add_argument(
+        "--conv-delta-stat",
+        type=str,
+        choices=["mean", "max"],
+        default="mean",
+        help="per-game statistic of absolute Q-value changes to monitor",
+    )
+    parser.add_argument(
+        "--conv-patience",
+        type=positive_int,
+        default=1,
+        help="number of consecutive games the criteria must hold to stop",
+    )
     arguments = parser.parse_args()
 
     # define framerate for the game so that events are synchronized
@@ -63,6 +114,18 @@ def main():
     # initialize the agent
     agent = Agent(DEBUG)
 
+    # initialize the convergence monitor
+    monitor = None
+    if arguments.early_stop:
+        monitor = ConvergenceMonitor(
+            window=arguments.conv_window,
+            min_games=arguments.conv_min_games,
+            score_tolerance=arguments.conv_score_tol,
+            delta_tolerance=arguments.conv_delta_tol,
+            delta_stat=arguments.conv_delta_stat,
+            patience=arguments.conv_patience,
+        )
+
     # create game window
     SCREEN = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
     pygame.display.set_caption("Flappy Bird")
@@ -96,15 +159,16 @@ def append_scores(scores, scores_avarages, score):
     scores_avarages.append(sum(scores) / len(scores))
 
 
-def end_game(scores, scores_avarages):
+def end_game(scores, scores_avarages, stop_reason):
     """Dumping agent's qvalues, creating plotted graphs and ending the game"""
+    print(f"Stopping: {stop_reason}")
     agent.dump_qvalues(force=True)
-    save_data_to_text_file(scores, scores_avarages)
+    save_data_to_text_file(scores, scores_avarages, stop_reason)
     pygame.quit()
     sys.exit()
 
 
-def save_data_to_text_file(scores, scores_avarages):
+def save_data_to_text_file(scores, scores_avarages, stop_reason=None):
     """Saves (game -> score) array to text file"""
     max_score = max(scores)
     max_game_index = scores.index(max_score) + 1
@@ -118,6 +182,8 @@ def save_data_to_text_file(scores, scores_avarages):
         f.write(f"{scores}\n")
         f.write("Avarages:\n")
         f.write(f"{scores_avarages}")
+        if stop_reason is not None:
+            f.write(f"\nStop reason: {stop_reason}")
 
 
 def generate_pipes(bottom_pipe_group, top_pipe_group, PIPE_GAP):
@@ -379,6 +445,10 @@ def mainGame():
                 print("Game over, updating scores")
             agent.update_scores()
             append_scores(scores, scores_avarages, score)
+            if monitor is not None and monitor.update(
+                score, agent.td_delta_mean, agent.td_delta_max
+            ):
+                end_game(scores, scores_avarages, monitor.stop_reason)
             game_over, score = reset_game(flappy, bottom_pipe_group, top_pipe_group)
             # restart_button.draw()
             # if restart_button.is_button_clicked() is True:
@@ -391,7 +461,7 @@ def mainGame():
                 event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE
             ):
                 append_scores(scores, scores_avarages, score)
-                end_game(scores, scores_avarages)
+                end_game(scores, scores_avarages, "Stopped by user")
             # start game
             # if (
             #    event.type == pygame.MOUSEBUTTONDOWN
@@ -402,7 +472,7 @@ def mainGame():
 
         # end game if we have reached game iterations
         if agent.game_count == ITER:
-            end_game(scores, scores_avarages)
+            end_game(scores, scores_avarages, f"Reached {ITER} game iterations")
         # save current data
         if (
             agent.game_count % 250 == 0
@@ -0,0 +1,277 @@
+"""Offline value iteration over the discretized (xdif, ydif, vel) state grid"""
+import argparse
+import json
+import os
+import numpy as np
+
+# state grid, the same as in initialize_qvalues.py
+GRID_STEP = 5
+X_VALUES = np.arange(-80, 510, GRID_STEP)
+Y_VALUES = np.arange(-300, 800, GRID_STEP)
+V_VALUES = np.arange(-10, 9)
+
+# game dynamics, mirrored from flappy_bird.py
+MOVE_SPEED = 7  # pipes scroll by 7 pixels every frame
+MAX_VELOCITY = 8
+FLAP_VELOCITY = -10
+PIPE_SPACING = 27 * MOVE_SPEED  # 900ms between pipes at 30 fps = 27 frames
+PIPE_SWITCH_XDIF = -30  # closest pipe switches to the next one past this xdif
+PIPE_HEIGHTS = np.arange(-100, 101)  # random gap offsets from generate_pipes
+
+# collision bounds expressed in (xdif, ydif) coordinates, where ydif is measured
+# to the center of the bottom pipe (gap 150, pipe 52x320, bird 34x24,
+# background height 512, screen height 624)
+PIPE_XDIF = 43  # bird overlaps the pipe horizontally when |xdif| < 43
+TOP_PIPE_YDIF = 298  # bird hits the top pipe when ydif > 298
+BOTTOM_PIPE_YDIF = 172  # bird hits the bottom pipe when ydif < 172
+GROUND_YDIF = 47  # bird hits the ground when ydif <= 47 + pipe_height
+CEILING_YDIF = 535  # bird leaves the screen when ydif > 535 + pipe_height
+
+
+OFFSETS = np.arange(GRID_STEP)  # pixel offsets of the bird inside a grid cell
+MAX_SHIFT = 2  # max number of cells xdif or ydif can move by in a single frame
+PIPE_KINDS = ("free", "pipe", "old")
+
+
+def cell_index(values, low, size):
+    """Map raw coordinates to grid indices the same way Agent.map_state does"""
+    return np.clip(np.floor_divide(values - low, GRID_STEP), 0, size - 1)
+
+
+def next_velocities():
+    """Returns velocity after the bird update for both actions (0, 1)"""
+    no_flap = np.minimum(V_VALUES + 1, MAX_VELOCITY)
+    flap = np.full(V_VALUES.shape, min(FLAP_VELOCITY + 1, MAX_VELOCITY))
+    return [no_flap, flap]
+
+
+def height_diff_distribution():
+    """Returns values of (next pipe height - current pipe height) and their probabilities"""
+    diffs, counts = np.unique(
+        np.subtract.outer(PIPE_HEIGHTS, PIPE_HEIGHTS), return_counts=True
+    )
+    return diffs, counts / counts.sum()
+
+
+def in_gap(y_moved):
+    """Predicate determining whether the bird fits between the pipes"""
+    return (y_moved >= BOTTOM_PIPE_YDIF) & (y_moved <= TOP_PIPE_YDIF)
+
+
+def pipe_kind(xdif):
+    """
+    Which pipe the bird overlaps with horizontally
+    "pipe" is the observed pipe, "old" the previous one, which is still checked for
+    collisions for a couple of frames after the observed pipe switches to the next one
+    """
+    if abs(xdif) < PIPE_XDIF:
+        return "pipe"
+    if -PIPE_XDIF < xdif - PIPE_SPACING <= PIPE_SWITCH_XDIF:
+        return "old"
+    return "free"
+
+
+def survival(y_moved, diffs, probs):
+    """Probability of surviving the frame for every pipe kind"""
+    # ground and ceiling, the height of the current pipe is unknown
+    ground = np.clip(PIPE_HEIGHTS[-1] + GROUND_YDIF + 1 - y_moved, 0, None)
+    ceiling = np.clip(y_moved - CEILING_YDIF - PIPE_HEIGHTS[0], 0, None)
+    alive = 1 - np.minimum(ground + ceiling, len(PIPE_HEIGHTS)) / len(PIPE_HEIGHTS)
+
+    # ydif of the previous pipe is shifted by the (unknown) height difference
+    cdf = np.concatenate(([0], np.cumsum(probs)))
+
+    def diff_below(value):
+        return cdf[np.clip(value - diffs[0], 0, len(probs))]
+
+    old_in_gap = diff_below(y_moved - BOTTOM_PIPE_YDIF + 1) - diff_below(
+        y_moved - TOP_PIPE_YDIF
+    )
+    return {
+        "free": alive,
+        "pipe": np.where(in_gap(y_moved), alive, 0),
+        "old": alive * old_in_gap,
+    }
+
+
+def build_model(reward):
+    """
+    Builds the transition model for both actions
+    The bird is assumed to be at any of the 5x5 pixel positions inside a grid cell with
+    equal probability, so every transition is averaged over those positions
+    Random parts are the gap height of the next pipe and the (unobserved) height of
+    the current pipe used for ground, ceiling and previous pipe collisions
+    Returns one dict per action with:
+      - coeffs: (x shift, y shift) -> probability of surviving into the shifted cell
+      - switches: (x, next x, pipe kind) -> probability of switching to the next pipe
+      - switch_probs: pipe kind -> (y, v, next y) probabilities after the switch
+    """
+    x_size, y_size, v_size = len(X_VALUES), len(Y_VALUES), len(V_VALUES)
+    diffs, probs = height_diff_distribution()
+    rows, cols = np.indices((y_size, v_size))
+    shifts = 2 * MAX_SHIFT + 1
+
+    model = []
+    for velocity in next_velocities():
+        # bird moves down by its velocity, which lowers ydif
+        y_shift = {kind: np.zeros((shifts, y_size, v_size)) for kind in PIPE_KINDS}
+        switch_probs = {
+            kind: np.zeros((y_size, v_size, y_size)) for kind in ("free", "pipe")
+        }
+        for offset in OFFSETS:
+            y_moved = Y_VALUES[:, None] + offset - velocity[None, :]
+            shift = np.floor_divide(offset - velocity, GRID_STEP) + MAX_SHIFT
+            alive = survival(y_moved, diffs, probs)
+            for kind in PIPE_KINDS:
+                y_shift[kind][shift, :, np.arange(v_size)] += alive[kind].T / GRID_STEP
+            for diff, prob in zip(diffs, probs):
+                target = cell_index(y_moved + diff, Y_VALUES[0], y_size)
+                for kind, matrix in switch_probs.items():
+                    np.add.at(
+                        matrix, (rows, cols, target), alive[kind] * prob / GRID_STEP
+                    )
+
+        # pipes move to the left, after the switch the bird observes the next pipe
+        coeffs = {}
+        switches = {}
+        alive_total = np.zeros((x_size, y_size, v_size))
+        for ix, x in enumerate(X_VALUES):
+            for offset in OFFSETS:
+                xdif = x + offset
+                kind = pipe_kind(xdif)
+                alive_total[ix] += y_shift[kind].sum(axis=0) / GRID_STEP
+                if xdif - MOVE_SPEED > PIPE_SWITCH_XDIF:
+                    x_shift = int(offset - MOVE_SPEED) // GRID_STEP
+                    for shift in range(shifts):
+                        if not y_shift[kind][shift].any():
+                            continue
+                        key = (x_shift, shift - MAX_SHIFT)
+                        if key not in coeffs:
+                            coeffs[key] = np.zeros((x_size, y_size, v_size))
+                        coeffs[key][ix] += y_shift[kind][shift] / GRID_STEP
+                else:
+                    x_next = int(
+                        cell_index(
+                            xdif - MOVE_SPEED + PIPE_SPACING, X_VALUES[0], x_size
+                        )
+                    )
+                    key = (ix, x_next, kind)
+                    switches[key] = switches.get(key, 0) + 1 / GRID_STEP
+
+        model.append(
+            {
+                "coeffs": coeffs,
+                "switches": switches,
+                "switch_probs": switch_probs,
+                "v_next": velocity - V_VALUES[0],
+                # expected immediate reward
+                "reward": alive_total * reward[0] + (1 - alive_total) * reward[1],
+            }
+        )
+    return model
+
+
+def value_iteration(reward, discount, tolerance, max_iter):
+    """
+    Runs vectorized value iteration
+    Returns Q values of shape (X, Y, V, 2)
+    """
+    model = build_model(reward)
+    x_size, y_size = len(X_VALUES), len(Y_VALUES)
+    values = np.zeros((x_size, y_size, len(V_VALUES)))
+    qvalues = np.zeros(values.shape + (2,))
+    padding = ((MAX_SHIFT, MAX_SHIFT), (MAX_SHIFT, MAX_SHIFT), (0, 0))
+
+    for i in range(max_iter):
+        for act, transition in enumerate(model):
+            next_values = values[:, :, transition["v_next"]]
+            # edge padding clips shifted cells to the grid like cell_index does
+            padded = np.pad(next_values, padding, mode="edge")
+            future = np.zeros(values.shape)
+            for (x_shift, y_shift), coeff in transition["coeffs"].items():
+                future += (
+                    coeff
+                    * padded[
+                        MAX_SHIFT + x_shift : MAX_SHIFT + x_shift + x_size,
+                        MAX_SHIFT + y_shift : MAX_SHIFT + y_shift + y_size,
+                    ]
+                )
+            switched = {}
+            for (ix, x_next, kind), prob in transition["switches"].items():
+                if (x_next, kind) not in switched:
+                    switched[(x_next, kind)] = np.einsum(
+                        "yvj,jv->yv",
+                        transition["switch_probs"][kind],
+                        next_values[x_next],
+                    )
+                future[ix] += prob * switched[(x_next, kind)]
+            qvalues[..., act] = transition["reward"] + discount * future
+
+        new_values = qvalues.max(axis=-1)
+        delta = np.abs(new_values - values).max()
+        values = new_values
+        if (i + 1) % 50 == 0:
+            print(f"iteration {i + 1}: max value change {delta:.6f}")
+        if delta < tolerance:
+            print(f"Converged after {i + 1} iterations")
+            break
+    return qvalues
+
+
+def dump_qvalues(qvalues, destination):
+    """Dump the Q values to a JSON file in the format read by Agent.load_qvalues"""
+    qval = {}
+    for ix, x in enumerate(X_VALUES):
+        for iy, y in enumerate(Y_VALUES):
+            for iv, v in enumerate(V_VALUES):
+                qval[f"{x}_{y}_{v}"] = qvalues[ix, iy, iv].tolist()
+    with open(destination, "w", encoding="utf-8") as f:
+        json.dump(qval, f)
+    print(f"Q-values saved to {destination}")
+
+
+def main():
+    parser = argparse.ArgumentParser("value_iteration.py")
+    parser.add_argument(
+        "--discount",
+        type=float,
+        default=0.99,
+        help="discount factor, has to be below 1 for the values to converge",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1e-3,
+        help="stop once the max value change of an iteration is below this",
+    )
+    parser.add_argument(
+        "--max-iter", type=int, default=5000, help="max number of iterations"
+    )
+    parser.add_argument(
+        "--destination",
+        type=str,
+        default="data/qvalues_value_iteration.json",
+        help="path of the JSON file to write Q values to, "
+        "use data/qvalues.json to warm start the agent",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="overwrite the destination file if it already exists",
+    )
+    arguments = parser.parse_args()
+    if os.path.exists(arguments.destination) and not arguments.force:
+        parser.error(
+            f"{arguments.destination} already exists, use --force to overwrite it"
+        )
+
+    # the same reward function as Agent.reward
+    reward = {0: 1, 1: -1000}
+    qvalues = value_iteration(
+        reward, arguments.discount, arguments.tolerance, arguments.max_iter
+    )
+    dump_qvalues(qvalues, arguments.destination)
+
+
+if __name__ == "__main__":
+    main()